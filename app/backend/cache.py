@@ -0,0 +1,110 @@
+"""Two-tier response cache for LLM calls.
+
+L1 is a small in-process LRU with per-entry TTL. L2 is Redis, used only when
+REDIS_URL is configured, so cached responses survive restarts and are shared
+between workers. Values must be JSON-serializable.
+"""
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from contextvars import ContextVar
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # Redis is optional; L1 alone still works
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+L1_MAX_ENTRIES = 1024
+
+_l1: "OrderedDict[str, tuple]" = OrderedDict()
+_redis = None
+
+# Per-request record of cache outcomes, read by the X-Cache middleware
+cache_status: ContextVar[Optional[List[str]]] = ContextVar("cache_status", default=None)
+
+def make_key(model: str, system_prompt: str, messages: List[Dict[str, str]]) -> str:
+    """Build a cache key from everything that determines the LLM output"""
+    payload = model + system_prompt + json.dumps(messages, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _get_redis():
+    global _redis
+    redis_url = os.environ.get('REDIS_URL')
+    if _redis is None and redis is not None and redis_url:
+        # Short timeouts so an unreachable Redis falls through to the LLM
+        _redis = redis.from_url(
+            redis_url,
+            decode_responses=True,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5
+        )
+    return _redis
+
+def _l1_get(key: str) -> Any:
+    entry = _l1.get(key)
+    if entry is None:
+        return None
+    expires_at, value = entry
+    if expires_at < monotonic():
+        del _l1[key]
+        return None
+    _l1.move_to_end(key)
+    return value
+
+def _l1_set(key: str, value: Any, ttl: int):
+    _l1[key] = (monotonic() + ttl, value)
+    _l1.move_to_end(key)
+    while len(_l1) > L1_MAX_ENTRIES:
+        _l1.popitem(last=False)
+
+def _record(status: str):
+    statuses = cache_status.get()
+    if statuses is not None:
+        statuses.append(status)
+
+async def get_or_set(key: str, coro_factory: Callable[[], Awaitable[Any]], ttl: int) -> Any:
+    """Return the cached value for key, or await coro_factory() and cache it.
+
+    Exceptions raised by coro_factory propagate and nothing is cached.
+    """
+    value = _l1_get(key)
+    if value is not None:
+        _record("HIT")
+        return value
+
+    r = _get_redis()
+    if r is not None:
+        try:
+            cached = await r.get(key)
+            if cached is not None:
+                value = json.loads(cached)
+                _l1_set(key, value, ttl)
+                _record("HIT")
+                return value
+        except Exception as e:
+            logger.warning(f"Redis cache read failed: {str(e)}")
+
+    _record("MISS")
+    value = await coro_factory()
+    _l1_set(key, value, ttl)
+
+    if r is not None:
+        try:
+            await r.set(key, json.dumps(value), ex=ttl)
+        except Exception as e:
+            logger.warning(f"Redis cache write failed: {str(e)}")
+
+    return value
+
+async def close():
+    """Close the Redis connection, if one was opened"""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
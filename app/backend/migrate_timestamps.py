@@ -0,0 +1,49 @@
+"""One-shot migration: convert ISO-string timestamps to native BSON Dates.
+
+Earlier versions of the backend stored `start_time`, `end_time` and
+`timestamp` as ISO-8601 strings. The server now writes datetimes directly,
+so existing documents need converting once. It also removes the
+`share_token: null` placeholder older versions wrote on every conversation,
+so the sparse share_token index only covers shared conversations:
+
+    cd /app/backend && python migrate_timestamps.py
+"""
+import asyncio
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# (collection, field) pairs that hold timestamps
+TIMESTAMP_FIELDS = [
+    ("conversations", "start_time"),
+    ("conversations", "end_time"),
+    ("messages", "timestamp"),
+]
+
+async def migrate():
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[os.environ.get('DB_NAME', 'ai_chat_portal')]
+
+    try:
+        for collection, field in TIMESTAMP_FIELDS:
+            result = await db[collection].update_many(
+                {field: {"$type": "string"}},
+                [{"$set": {field: {"$toDate": f"${field}"}}}]
+            )
+            print(f"{collection}.{field}: converted {result.modified_count} documents")
+
+        result = await db.conversations.update_many(
+            {"share_token": {"$type": "null"}},
+            {"$unset": {"share_token": ""}}
+        )
+        print(f"conversations.share_token: removed {result.modified_count} null values")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -1,33 +1,48 @@
 from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
+from starlette.datastructures import MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
 import os
+import io
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 import uuid
+from urllib.parse import quote
 from datetime import datetime, timezone
 from emergentintegrations.llm.chat import LlmChat, UserMessage
 import json
+import orjson
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-import markdown2
+import cache
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    tz_aware=True,
+    maxPoolSize=200,
+    minPoolSize=20,
+    compressors='zstd',  # wire compression; needs the zstandard package
+    zlibCompressionLevel=-1,
+    serverSelectionTimeoutMS=3000
+)
 db = client[os.environ.get('DB_NAME', 'ai_chat_portal')]
 
-# Create the main app without a prefix
-app = FastAPI()
+# Create the main app without a prefix; orjson serializes datetimes natively
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -82,28 +97,65 @@ class ReactionRequest(BaseModel):
 class ExportRequest(BaseModel):
     format: str  # 'pdf', 'json', 'markdown'
 
+# LLM settings shared by the chat helpers
+LLM_PROVIDER = "openai"
+LLM_MODEL = "gpt-4o-mini"
+CHAT_SYSTEM_MESSAGE = "You are a helpful, friendly AI assistant. Provide clear and concise responses."
+SUGGESTIONS_SYSTEM_MESSAGE = "Generate 3 brief follow-up questions (max 8 words each) based on the conversation. Return only the questions, one per line."
+SUMMARY_SYSTEM_MESSAGE = "You summarize conversations concisely, highlighting key points and topics discussed."
+QUERY_SYSTEM_MESSAGE = "You analyze past conversations and provide insights based on their summaries."
+
+# Response cache settings (seconds / number of trailing messages in the key)
+CHAT_CACHE_TTL = 4 * 60 * 60
+SUGGESTIONS_CACHE_TTL = 15 * 60
+CACHE_CONTEXT_MESSAGES = 3
+
+# Timestamp fields that may still hold ISO strings on un-migrated documents
+CONVERSATION_DT_FIELDS = ("start_time", "end_time")
+MESSAGE_DT_FIELDS = ("timestamp",)
+
+# Number of recent ended conversations summarized into a query prompt
+QUERY_CONTEXT_CONVERSATIONS = 20
+
+def get_chat(session_id: str, system_message: str) -> LlmChat:
+    """Create an LlmChat for the configured model.
+
+    session_id is bound at construction and the chat keeps per-session state,
+    so instances are not shared between requests.
+    """
+    return LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=session_id,
+        system_message=system_message
+    ).with_model(LLM_PROVIDER, LLM_MODEL)
+
 # Helper function to call LLM using emergentintegrations
 async def call_llm(messages: List[Dict[str, str]], conversation_id: str, max_tokens: int = 500) -> str:
     """Call LLM via emergentintegrations with conversation context"""
     try:
-        # Initialize LlmChat with conversation-specific session
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=conversation_id,
-            system_message="You are a helpful, friendly AI assistant. Provide clear and concise responses."
-        ).with_model("openai", "gpt-4o-mini")
-        
         # Get the last user message
         last_message = messages[-1] if messages else {"content": ""}
         user_message = UserMessage(text=last_message.get('content', ''))
         
-        # Send message and get response
-        response = await chat.send_message(user_message)
-        return response
+        async def send():
+            # Initialize LlmChat with conversation-specific session
+            chat = get_chat(conversation_id, CHAT_SYSTEM_MESSAGE)
+            return await chat.send_message(user_message)
+        
+        # Identical recent context gets the cached response
+        key = cache.make_key(LLM_MODEL, CHAT_SYSTEM_MESSAGE, messages[-CACHE_CONTEXT_MESSAGES:])
+        return await cache.get_or_set(key, send, CHAT_CACHE_TTL)
     except Exception as e:
         logging.error(f"Error calling LLM: {str(e)}")
         return f"Error generating response: {str(e)}"
 
+async def stream_llm(messages: List[Dict[str, str]], conversation_id: str) -> AsyncIterator[str]:
+    """Yield the AI response in chunks as they become available"""
+    # LlmChat only returns complete responses, so the reply arrives as a single
+    # chunk; swap in the SDK's streaming call here once it provides one. Until
+    # then the frontend keeps using POST /messages.
+    yield await call_llm(messages, conversation_id)
+
 # Generate conversation suggestions
 async def generate_suggestions(conversation_history: List[Dict[str, str]]) -> List[str]:
     """Generate contextual conversation suggestions"""
@@ -119,22 +171,95 @@ async def generate_suggestions(conversation_history: List[Dict[str, str]]) -> Li
         recent = conversation_history[-3:] if len(conversation_history) >= 3 else conversation_history
         context = "\n".join([f"{m['role']}: {m['content']}" for m in recent])
         
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"suggestions_{uuid.uuid4()}",
-            system_message="Generate 3 brief follow-up questions (max 8 words each) based on the conversation. Return only the questions, one per line."
-        ).with_model("openai", "gpt-4o-mini")
-        
-        prompt = UserMessage(text=f"Recent conversation:\n{context}\n\nGenerate 3 relevant follow-up questions:")
-        response = await chat.send_message(prompt)
+        async def generate():
+            chat = get_chat(f"suggestions_{uuid.uuid4()}", SUGGESTIONS_SYSTEM_MESSAGE)
+            
+            prompt = UserMessage(text=f"Recent conversation:\n{context}\n\nGenerate 3 relevant follow-up questions:")
+            response = await chat.send_message(prompt)
+            
+            # Parse suggestions
+            suggestions = [s.strip() for s in response.split('\n') if s.strip() and not s.strip().startswith('#')]
+            return suggestions[:3]
         
-        # Parse suggestions
-        suggestions = [s.strip() for s in response.split('\n') if s.strip() and not s.strip().startswith('#')]
-        return suggestions[:3]
+        key = cache.make_key(LLM_MODEL, SUGGESTIONS_SYSTEM_MESSAGE, recent)
+        return await cache.get_or_set(key, generate, SUGGESTIONS_CACHE_TTL)
     except Exception as e:
         logging.error(f"Error generating suggestions: {str(e)}")
         return []
 
+# Parse ISO-string timestamps left on documents not yet converted by migrate_timestamps.py
+def _parse_dt_fields(docs: List[Dict[str, Any]], fields: tuple, _fromiso=datetime.fromisoformat):
+    """Convert string values of the given fields to datetimes in place"""
+    for field in fields:
+        for d in docs:
+            v = d.get(field)
+            if type(v) is str:
+                d[field] = _fromiso(v)
+
+# Render a conversation to PDF (blocking; run in an executor)
+def _build_pdf(conv: Dict[str, Any], messages: List[Dict[str, Any]]) -> bytes:
+    """Build the PDF export for a conversation in memory"""
+    buf = io.BytesIO()
+    doc = SimpleDocTemplate(buf, pagesize=letter)
+    styles = getSampleStyleSheet()
+    story = []
+    
+    # Title
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=12
+    )
+    story.append(Paragraph(conv['title'], title_style))
+    story.append(Spacer(1, 0.2*inch))
+    
+    # Summary
+    if conv.get('summary'):
+        story.append(Paragraph(f"<b>Summary:</b> {conv['summary']}", styles['Normal']))
+        story.append(Spacer(1, 0.3*inch))
+    
+    # Messages
+    for msg in messages:
+        role_text = f"<b>{msg['role'].capitalize()}:</b>"
+        story.append(Paragraph(role_text, styles['Heading3']))
+        story.append(Paragraph(msg['content'], styles['Normal']))
+        story.append(Spacer(1, 0.2*inch))
+    
+    doc.build(story)
+    return buf.getvalue()
+
+# Validate a conversation and build the LLM context for a new user message
+async def _start_turn(conversation_id: str, content: str):
+    """Return the unsaved user Message and the message list to send to the LLM"""
+    # Read history before inserting so the new message needn't be re-fetched
+    conv, history = await asyncio.gather(
+        db.conversations.find_one({"id": conversation_id}, {"_id": 0}),
+        db.messages.find(
+            {"conversation_id": conversation_id},
+            {"_id": 0, "role": 1, "content": 1, "timestamp": 1}
+        ).sort("timestamp", 1).to_list(length=None)
+    )
+    if not conv:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    if conv['status'] != 'active':
+        raise HTTPException(status_code=400, detail="Conversation has ended")
+    
+    user_msg = Message(
+        conversation_id=conversation_id,
+        role="user",
+        content=content
+    )
+    
+    lm_messages = [
+        {"role": msg['role'], "content": msg['content']}
+        for msg in history
+    ]
+    lm_messages.append({"role": "user", "content": content})
+    
+    return user_msg, lm_messages
+
 # API Routes
 @api_router.get("/")
 async def root():
@@ -144,40 +269,30 @@ async def root():
 @api_router.get("/conversations", response_model=List[Conversation])
 async def get_conversations():
     """Get all conversations with basic info"""
-    conversations = await db.conversations.find({}, {"_id": 0}).to_list(1000)
-    
-    for conv in conversations:
-        if isinstance(conv.get('start_time'), str):
-            conv['start_time'] = datetime.fromisoformat(conv['start_time'])
-        if conv.get('end_time') and isinstance(conv['end_time'], str):
-            conv['end_time'] = datetime.fromisoformat(conv['end_time'])
-    
-    conversations.sort(key=lambda x: x['start_time'], reverse=True)
+    # Only the fields the dashboard list renders (summary is shown on each card)
+    conversations = await db.conversations.find(
+        {},
+        {"_id": 0, "id": 1, "title": 1, "status": 1, "summary": 1, "start_time": 1, "end_time": 1}
+    ).sort("start_time", -1).to_list(length=None)
+    _parse_dt_fields(conversations, CONVERSATION_DT_FIELDS)
     return conversations
 
 @api_router.get("/conversations/{conversation_id}")
 async def get_conversation(conversation_id: str):
     """Get specific conversation with full message history"""
-    conv = await db.conversations.find_one({"id": conversation_id}, {"_id": 0})
+    conv, messages = await asyncio.gather(
+        db.conversations.find_one({"id": conversation_id}, {"_id": 0}),
+        db.messages.find(
+            {"conversation_id": conversation_id}, 
+            {"_id": 0}
+        ).sort("timestamp", 1).to_list(length=None)
+    )
     
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    if isinstance(conv.get('start_time'), str):
-        conv['start_time'] = datetime.fromisoformat(conv['start_time'])
-    if conv.get('end_time') and isinstance(conv['end_time'], str):
-        conv['end_time'] = datetime.fromisoformat(conv['end_time'])
-    
-    messages = await db.messages.find(
-        {"conversation_id": conversation_id}, 
-        {"_id": 0}
-    ).to_list(1000)
-    
-    for msg in messages:
-        if isinstance(msg.get('timestamp'), str):
-            msg['timestamp'] = datetime.fromisoformat(msg['timestamp'])
-    
-    messages.sort(key=lambda x: x['timestamp'])
+    _parse_dt_fields([conv], CONVERSATION_DT_FIELDS)
+    _parse_dt_fields(messages, MESSAGE_DT_FIELDS)
     
     # Generate suggestions if active
     suggestions = []
@@ -195,8 +310,8 @@ async def get_conversation(conversation_id: str):
 async def create_conversation(input: ConversationCreate):
     """Create new conversation"""
     conv = Conversation(title=input.title)
-    doc = conv.model_dump()
-    doc['start_time'] = doc['start_time'].isoformat()
+    # No share_token until shared, so the sparse share_token index skips it
+    doc = conv.model_dump(exclude={'share_token'})
     
     await db.conversations.insert_one(doc)
     return conv
@@ -204,76 +319,97 @@ async def create_conversation(input: ConversationCreate):
 @api_router.post("/conversations/{conversation_id}/messages", response_model=Message)
 async def send_message(conversation_id: str, input: MessageCreate):
     """Send message and get AI response"""
-    conv = await db.conversations.find_one({"id": conversation_id}, {"_id": 0})
-    if not conv:
-        raise HTTPException(status_code=404, detail="Conversation not found")
-    
-    if conv['status'] != 'active':
-        raise HTTPException(status_code=400, detail="Conversation has ended")
-    
-    # Save user message
-    user_msg = Message(
-        conversation_id=conversation_id,
-        role="user",
-        content=input.content
-    )
-    user_doc = user_msg.model_dump()
-    user_doc['timestamp'] = user_doc['timestamp'].isoformat()
-    await db.messages.insert_one(user_doc)
-    
-    # Get conversation history for context
-    messages = await db.messages.find(
-        {"conversation_id": conversation_id},
-        {"_id": 0}
-    ).to_list(1000)
-    
-    lm_messages = [
-        {"role": msg['role'], "content": msg['content']}
-        for msg in sorted(messages, key=lambda x: x['timestamp'])
-    ]
+    user_msg, lm_messages = await _start_turn(conversation_id, input.content)
     
     # Get AI response
     ai_response = await call_llm(lm_messages, conversation_id)
     
-    # Save AI message
     ai_msg = Message(
         conversation_id=conversation_id,
         role="assistant",
         content=ai_response
     )
-    ai_doc = ai_msg.model_dump()
-    ai_doc['timestamp'] = ai_doc['timestamp'].isoformat()
-    await db.messages.insert_one(ai_doc)
+    
+    # Save user and AI messages in a single round trip
+    await db.messages.insert_many(
+        [user_msg.model_dump(), ai_msg.model_dump()],
+        ordered=True
+    )
     
     return ai_msg
 
+# Strong references to in-flight background writes (see stream_message)
+_background_tasks = set()
+
+def _sse(event: str, data: Any) -> bytes:
+    """Format one server-sent event with a JSON payload"""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+@api_router.post("/conversations/{conversation_id}/messages/stream")
+async def stream_message(conversation_id: str, input: MessageCreate):
+    """Send message and stream the AI response as server-sent events"""
+    user_msg, lm_messages = await _start_turn(conversation_id, input.content)
+    
+    async def event_stream():
+        chunks = []
+        completed = False
+        try:
+            yield _sse("user", user_msg.model_dump())
+            async for chunk in stream_llm(lm_messages, conversation_id):
+                chunks.append(chunk)
+                yield _sse("delta", {"content": chunk})
+            completed = True
+        finally:
+            ai_msg = Message(
+                conversation_id=conversation_id,
+                role="assistant",
+                content="".join(chunks)
+            )
+            # Nothing is saved if the client left before any reply, so history
+            # never holds a user message without its answer
+            if completed or chunks:
+                # Shielded so the turn is saved even if the client disconnects
+                # mid-stream; referenced until done so it can't be garbage-collected
+                task = asyncio.ensure_future(db.messages.insert_many(
+                    [user_msg.model_dump(), ai_msg.model_dump()],
+                    ordered=True
+                ))
+                _background_tasks.add(task)
+                task.add_done_callback(_background_tasks.discard)
+                await asyncio.shield(task)
+        
+        yield _sse("done", ai_msg.model_dump())
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.post("/conversations/{conversation_id}/end", response_model=Conversation)
 async def end_conversation(conversation_id: str):
     """End conversation and generate AI summary"""
-    conv = await db.conversations.find_one({"id": conversation_id}, {"_id": 0})
+    conv, messages = await asyncio.gather(
+        db.conversations.find_one({"id": conversation_id}, {"_id": 0}),
+        db.messages.find(
+            {"conversation_id": conversation_id},
+            {"_id": 0}
+        ).sort("timestamp", 1).to_list(length=None)
+    )
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
     if conv['status'] == 'ended':
         raise HTTPException(status_code=400, detail="Conversation already ended")
     
-    messages = await db.messages.find(
-        {"conversation_id": conversation_id},
-        {"_id": 0}
-    ).to_list(1000)
-    
     conversation_text = "\n".join([
         f"{msg['role']}: {msg['content']}"
-        for msg in sorted(messages, key=lambda x: x['timestamp'])
+        for msg in messages
     ])
     
     # Generate summary
     try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"summary_{conversation_id}",
-            system_message="You summarize conversations concisely, highlighting key points and topics discussed."
-        ).with_model("openai", "gpt-4o-mini")
+        chat = get_chat(f"summary_{conversation_id}", SUMMARY_SYSTEM_MESSAGE)
         
         prompt = UserMessage(text=f"Summarize this conversation in 2-3 sentences:\n\n{conversation_text}")
         summary = await chat.send_message(prompt)
@@ -286,25 +422,26 @@ async def end_conversation(conversation_id: str):
         {"$set": {
             "status": "ended",
             "summary": summary,
-            "end_time": end_time.isoformat()
+            "end_time": end_time
         }}
     )
     
     conv['status'] = 'ended'
     conv['summary'] = summary
     conv['end_time'] = end_time
-    if isinstance(conv.get('start_time'), str):
-        conv['start_time'] = datetime.fromisoformat(conv['start_time'])
+    _parse_dt_fields([conv], CONVERSATION_DT_FIELDS)
     
-    return Conversation(**conv)
+    # Document came from Mongo and response_model validates on output
+    return Conversation.model_construct(**conv)
 
 @api_router.post("/conversations/query", response_model=QueryResponse)
 async def query_conversations(input: QueryRequest):
     """Query AI about past conversations"""
+    # Only the most recent summaries go into the prompt to bound token count
     conversations = await db.conversations.find(
         {"status": "ended"},
-        {"_id": 0}
-    ).to_list(1000)
+        {"_id": 0, "id": 1, "title": 1, "summary": 1, "start_time": 1}
+    ).sort("start_time", -1).limit(QUERY_CONTEXT_CONVERSATIONS).to_list(length=None)
     
     if not conversations:
         return QueryResponse(
@@ -321,11 +458,7 @@ async def query_conversations(input: QueryRequest):
     context = "\n\n".join(context_parts)
     
     try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"query_{uuid.uuid4()}",
-            system_message="You analyze past conversations and provide insights based on their summaries."
-        ).with_model("openai", "gpt-4o-mini")
+        chat = get_chat(f"query_{uuid.uuid4()}", QUERY_SYSTEM_MESSAGE)
         
         prompt = UserMessage(text=f"Past conversations:\n\n{context}\n\nUser question: {input.query}\n\nProvide a clear answer:")
         answer = await chat.send_message(prompt)
@@ -342,38 +475,38 @@ async def query_conversations(input: QueryRequest):
 @api_router.post("/messages/{message_id}/react")
 async def react_to_message(message_id: str, input: ReactionRequest):
     """Add reaction to a message"""
-    msg = await db.messages.find_one({"id": message_id}, {"_id": 0})
-    if not msg:
-        raise HTTPException(status_code=404, detail="Message not found")
-    
-    reactions = msg.get('reactions', [])
-    if input.reaction in reactions:
-        reactions.remove(input.reaction)
-    else:
-        reactions.append(input.reaction)
-    
-    await db.messages.update_one(
+    # Toggle atomically in a pipeline update so concurrent reactions aren't lost
+    reactions = {"$ifNull": ["$reactions", []]}
+    # $literal so a reaction starting with "$" isn't read as a field path
+    reaction = {"$literal": input.reaction}
+    msg = await db.messages.find_one_and_update(
         {"id": message_id},
-        {"$set": {"reactions": reactions}}
+        [{"$set": {"reactions": {"$cond": [
+            {"$in": [reaction, reactions]},
+            {"$filter": {"input": reactions, "cond": {"$ne": ["$$this", reaction]}}},
+            {"$concatArrays": [reactions, [reaction]]}
+        ]}}}],
+        projection={"_id": 0, "reactions": 1},
+        return_document=ReturnDocument.AFTER
     )
+    if not msg:
+        raise HTTPException(status_code=404, detail="Message not found")
     
-    return {"success": True, "reactions": reactions}
+    return {"success": True, "reactions": msg['reactions']}
 
 @api_router.post("/messages/{message_id}/bookmark")
 async def bookmark_message(message_id: str):
     """Toggle bookmark on a message"""
-    msg = await db.messages.find_one({"id": message_id}, {"_id": 0})
-    if not msg:
-        raise HTTPException(status_code=404, detail="Message not found")
-    
-    bookmarked = not msg.get('bookmarked', False)
-    
-    await db.messages.update_one(
+    msg = await db.messages.find_one_and_update(
         {"id": message_id},
-        {"$set": {"bookmarked": bookmarked}}
+        [{"$set": {"bookmarked": {"$not": [{"$ifNull": ["$bookmarked", False]}]}}}],
+        projection={"_id": 0, "bookmarked": 1},
+        return_document=ReturnDocument.AFTER
     )
+    if not msg:
+        raise HTTPException(status_code=404, detail="Message not found")
     
-    return {"success": True, "bookmarked": bookmarked}
+    return {"success": True, "bookmarked": msg['bookmarked']}
 
 # Conversation sharing
 @api_router.post("/conversations/{conversation_id}/share")
@@ -395,25 +528,20 @@ async def share_conversation(conversation_id: str):
 @api_router.get("/shared/{share_token}")
 async def get_shared_conversation(share_token: str):
     """Get conversation by share token"""
-    conv = await db.conversations.find_one({"share_token": share_token}, {"_id": 0})
+    conv = await db.conversations.find_one(
+        {"share_token": share_token},
+        {"_id": 0, "id": 1, "title": 1, "status": 1, "summary": 1, "start_time": 1, "end_time": 1}
+    )
     if not conv:
         raise HTTPException(status_code=404, detail="Shared conversation not found")
     
     messages = await db.messages.find(
         {"conversation_id": conv['id']},
         {"_id": 0}
-    ).to_list(1000)
+    ).sort("timestamp", 1).to_list(length=None)
     
-    for msg in messages:
-        if isinstance(msg.get('timestamp'), str):
-            msg['timestamp'] = datetime.fromisoformat(msg['timestamp'])
-    
-    messages.sort(key=lambda x: x['timestamp'])
-    
-    if isinstance(conv.get('start_time'), str):
-        conv['start_time'] = datetime.fromisoformat(conv['start_time'])
-    if conv.get('end_time') and isinstance(conv['end_time'], str):
-        conv['end_time'] = datetime.fromisoformat(conv['end_time'])
+    _parse_dt_fields([conv], CONVERSATION_DT_FIELDS)
+    _parse_dt_fields(messages, MESSAGE_DT_FIELDS)
     
     return {
         "conversation": conv,
@@ -424,22 +552,22 @@ async def get_shared_conversation(share_token: str):
 @api_router.post("/conversations/{conversation_id}/export")
 async def export_conversation(conversation_id: str, input: ExportRequest):
     """Export conversation in requested format"""
-    conv = await db.conversations.find_one({"id": conversation_id}, {"_id": 0})
+    conv, messages = await asyncio.gather(
+        db.conversations.find_one({"id": conversation_id}, {"_id": 0}),
+        db.messages.find(
+            {"conversation_id": conversation_id},
+            {"_id": 0}
+        ).sort("timestamp", 1).to_list(length=None)
+    )
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    messages = await db.messages.find(
-        {"conversation_id": conversation_id},
-        {"_id": 0}
-    ).to_list(1000)
-    messages.sort(key=lambda x: x['timestamp'])
-    
     if input.format == 'json':
         data = {
             "conversation": conv,
             "messages": messages
         }
-        return JSONResponse(content=data)
+        return ORJSONResponse(content=data)
     
     elif input.format == 'markdown':
         md_content = f"# {conv['title']}\n\n"
@@ -459,45 +587,63 @@ async def export_conversation(conversation_id: str, input: ExportRequest):
             if msg.get('reactions'):
                 md_content += f"Reactions: {' '.join(msg['reactions'])}\n\n"
         
-        return JSONResponse(content={"markdown": md_content})
+        return ORJSONResponse(content={"markdown": md_content})
     
     elif input.format == 'pdf':
-        pdf_path = f"/tmp/conversation_{conversation_id}.pdf"
-        doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
+        # ReportLab is CPU-bound; keep it off the event loop
+        pdf = await asyncio.get_running_loop().run_in_executor(None, _build_pdf, conv, messages)
         
-        # Title
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=12
-        )
-        story.append(Paragraph(conv['title'], title_style))
-        story.append(Spacer(1, 0.2*inch))
+        # Same Content-Disposition encoding FileResponse uses for non-ASCII titles
+        filename = f"{conv['title']}.pdf"
+        quoted = quote(filename)
+        if quoted != filename:
+            disposition = f"attachment; filename*=utf-8''{quoted}"
+        else:
+            disposition = f'attachment; filename="{filename}"'
         
-        # Summary
-        if conv.get('summary'):
-            story.append(Paragraph(f"<b>Summary:</b> {conv['summary']}", styles['Normal']))
-            story.append(Spacer(1, 0.3*inch))
-        
-        # Messages
-        for msg in messages:
-            role_text = f"<b>{msg['role'].capitalize()}:</b>"
-            story.append(Paragraph(role_text, styles['Heading3']))
-            story.append(Paragraph(msg['content'], styles['Normal']))
-            story.append(Spacer(1, 0.2*inch))
-        
-        doc.build(story)
-        return FileResponse(pdf_path, media_type='application/pdf', filename=f"{conv['title']}.pdf")
+        return Response(
+            content=pdf,
+            media_type='application/pdf',
+            headers={'Content-Disposition': disposition}
+        )
     
     else:
         raise HTTPException(status_code=400, detail="Invalid export format")
 
+class CacheHeaderMiddleware:
+    """Report whether LLM calls made by a request were served from cache.
+
+    Plain ASGI so the handler runs in the same task and context. Streamed
+    responses send their headers before the LLM is called, so they carry no
+    X-Cache header.
+    """
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        statuses = []
+        
+        async def send_with_cache_header(message):
+            if message["type"] == "http.response.start" and statuses:
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Cache", "MISS" if "MISS" in statuses else "HIT")
+            await send(message)
+        
+        token = cache.cache_status.set(statuses)
+        try:
+            await self.app(scope, receive, send_with_cache_header)
+        finally:
+            cache.cache_status.reset(token)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(CacheHeaderMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -512,6 +658,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    """Ensure indexes backing the lookup and sort patterns used above"""
+    await db.conversations.create_index("id", unique=True)
+    await db.conversations.create_index([("start_time", -1)])
+    try:
+        # Drop the non-sparse index from older versions first, since Mongo rejects
+        # a second index on the same key; every worker tries and only one wins
+        await db.conversations.drop_index("share_token_1")
+    except OperationFailure as e:
+        if e.code not in (26, 27):  # NamespaceNotFound, IndexNotFound
+            raise
+    await db.conversations.create_index("share_token", sparse=True, name="share_token_sparse")
+    await db.messages.create_index("id", unique=True)
+    await db.messages.create_index([("conversation_id", 1), ("timestamp", 1)])
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+    await cache.close()
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+import cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    """Run each test against an empty L1 and no Redis"""
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    monkeypatch.setattr(cache, "_redis", None)
+    cache._l1.clear()
+    yield
+    cache._l1.clear()
+
+
+class Counter:
+    """coro_factory stand-in that records how often it was awaited"""
+    def __init__(self, value="response"):
+        self.value = value
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_hit_after_set():
+    factory = Counter()
+
+    first = asyncio.run(cache.get_or_set("key", factory, ttl=60))
+    second = asyncio.run(cache.get_or_set("key", factory, ttl=60))
+
+    assert first == second == "response"
+    assert factory.calls == 1
+
+
+def test_expired_entry_is_recomputed(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache, "monotonic", lambda: now[0])
+    factory = Counter()
+
+    asyncio.run(cache.get_or_set("key", factory, ttl=60))
+    now[0] += 61
+    asyncio.run(cache.get_or_set("key", factory, ttl=60))
+
+    assert factory.calls == 2
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    monkeypatch.setattr(cache, "L1_MAX_ENTRIES", 2)
+    factory = Counter()
+
+    async def scenario():
+        await cache.get_or_set("a", factory, ttl=60)
+        await cache.get_or_set("b", factory, ttl=60)
+        await cache.get_or_set("a", factory, ttl=60)  # "a" is now most recent
+        await cache.get_or_set("c", factory, ttl=60)  # evicts "b"
+
+    asyncio.run(scenario())
+
+    assert list(cache._l1) == ["a", "c"]
+    assert factory.calls == 3
+
+
+def test_factory_error_is_not_cached():
+    async def failing():
+        raise RuntimeError("LLM unavailable")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_set("key", failing, ttl=60))
+
+    assert "key" not in cache._l1
+
+    factory = Counter()
+    assert asyncio.run(cache.get_or_set("key", factory, ttl=60)) == "response"
+    assert factory.calls == 1
+
+
+def test_outcomes_are_recorded_for_the_request():
+    statuses = []
+    token = cache.cache_status.set(statuses)
+    try:
+        factory = Counter()
+        asyncio.run(cache.get_or_set("key", factory, ttl=60))
+        asyncio.run(cache.get_or_set("key", factory, ttl=60))
+    finally:
+        cache.cache_status.reset(token)
+
+    assert statuses == ["MISS", "HIT"]
@@ -1,4 +1,5 @@
-import requests
+import asyncio
+import httpx
 import sys
 import json
 from datetime import datetime
@@ -10,8 +11,19 @@ class AIPortalAPITester:
         self.tests_run = 0
         self.tests_passed = 0
         self.conversation_id = None
+        self.message_id = None
+        # One pooled HTTP/2 client so tests reuse connections instead of re-handshaking
+        self.client = httpx.AsyncClient(
+            base_url=self.api_url,
+            http2=True,
+            timeout=30,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+
+    async def close(self):
+        await self.client.aclose()
 
-    def run_test(self, name, method, endpoint, expected_status, data=None, headers=None):
+    async def run_test(self, name, method, endpoint, expected_status, data=None, headers=None):
         """Run a single API test"""
         url = f"{self.api_url}/{endpoint}" if endpoint else f"{self.api_url}/"
         if headers is None:
@@ -22,14 +34,7 @@ class AIPortalAPITester:
         print(f"   URL: {url}")
         
         try:
-            if method == 'GET':
-                response = requests.get(url, headers=headers, timeout=30)
-            elif method == 'POST':
-                response = requests.post(url, json=data, headers=headers, timeout=30)
-            elif method == 'PUT':
-                response = requests.put(url, json=data, headers=headers, timeout=30)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=headers, timeout=30)
+            response = await self.client.request(method, endpoint, json=data, headers=headers, timeout=30)
 
             success = response.status_code == expected_status
             if success:
@@ -50,19 +55,19 @@ class AIPortalAPITester:
                     print(f"   Error: {response.text}")
                 return False, {}
 
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             print(f"❌ Failed - Request timeout (30s)")
             return False, {}
-        except requests.exceptions.ConnectionError:
+        except httpx.ConnectError:
             print(f"❌ Failed - Connection error")
             return False, {}
         except Exception as e:
             print(f"❌ Failed - Error: {str(e)}")
             return False, {}
 
-    def test_api_root(self):
+    async def test_api_root(self):
         """Test API root endpoint"""
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "API Root",
             "GET",
             "",
@@ -70,9 +75,9 @@ class AIPortalAPITester:
         )
         return success
 
-    def test_get_conversations_empty(self):
+    async def test_get_conversations_empty(self):
         """Test getting conversations when empty"""
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Get Conversations (Empty)",
             "GET",
             "conversations",
@@ -80,10 +85,10 @@ class AIPortalAPITester:
         )
         return success
 
-    def test_create_conversation(self):
+    async def test_create_conversation(self):
         """Test creating a new conversation"""
         test_title = f"Test Conversation {datetime.now().strftime('%H:%M:%S')}"
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Create Conversation",
             "POST",
             "conversations",
@@ -95,9 +100,9 @@ class AIPortalAPITester:
             print(f"   Created conversation ID: {self.conversation_id}")
         return success
 
-    def test_get_conversations_with_data(self):
+    async def test_get_conversations_with_data(self):
         """Test getting conversations after creating one"""
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Get Conversations (With Data)",
             "GET",
             "conversations",
@@ -107,13 +112,13 @@ class AIPortalAPITester:
             print(f"   Found {len(response)} conversations")
         return success
 
-    def test_get_specific_conversation(self):
+    async def test_get_specific_conversation(self):
         """Test getting a specific conversation"""
         if not self.conversation_id:
             print("❌ Skipped - No conversation ID available")
             return False
             
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Get Specific Conversation",
             "GET",
             f"conversations/{self.conversation_id}",
@@ -121,13 +126,13 @@ class AIPortalAPITester:
         )
         return success
 
-    def test_send_message(self):
+    async def test_send_message(self):
         """Test sending a message to conversation"""
         if not self.conversation_id:
             print("❌ Skipped - No conversation ID available")
             return False
             
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Send Message",
             "POST",
             f"conversations/{self.conversation_id}/messages",
@@ -135,17 +140,107 @@ class AIPortalAPITester:
             data={"content": "Hello, this is a test message"}
         )
         if success:
+            self.message_id = response.get('id')
             print("   Message sent successfully")
             # Note: AI response depends on LM Studio being available
         return success
 
-    def test_end_conversation(self):
+    async def test_react_literal_reaction(self):
+        """Test that a $-prefixed reaction is stored verbatim and toggles off again"""
+        if not self.message_id:
+            print("❌ Skipped - No message ID available")
+            return False
+
+        reaction = "$content"
+        success, response = await self.run_test(
+            "React With $-Prefixed Reaction",
+            "POST",
+            f"messages/{self.message_id}/react",
+            200,
+            data={"reaction": reaction}
+        )
+        if success and response.get('reactions') != [reaction]:
+            print(f"❌ Reaction did not round-trip: {response.get('reactions')}")
+            self.tests_passed -= 1
+            return False
+
+        success, response = await self.run_test(
+            "Remove $-Prefixed Reaction",
+            "POST",
+            f"messages/{self.message_id}/react",
+            200,
+            data={"reaction": reaction}
+        )
+        if success and response.get('reactions') != []:
+            print(f"❌ Reaction was not removed: {response.get('reactions')}")
+            self.tests_passed -= 1
+            return False
+        return success
+
+    async def test_send_message_stream(self):
+        """Test streaming a reply as server-sent events and that the turn is saved"""
+        if not self.conversation_id:
+            print("❌ Skipped - No conversation ID available")
+            return False
+
+        endpoint = f"conversations/{self.conversation_id}/messages/stream"
+        self.tests_run += 1
+        print(f"\n🔍 Testing Send Message (Stream)...")
+        print(f"   URL: {self.api_url}/{endpoint}")
+
+        try:
+            response = await self.client.post(endpoint, json={"content": "Hello, this is a streamed test message"})
+            if response.status_code != 200:
+                print(f"❌ Failed - Expected 200, got {response.status_code}")
+                return False
+
+            events = []
+            for raw in response.text.split("\n\n"):
+                if not raw.strip():
+                    continue
+                fields = dict(line.split(": ", 1) for line in raw.splitlines())
+                events.append((fields["event"], json.loads(fields["data"])))
+
+            names = [name for name, _ in events]
+            if len(names) < 2 or names[0] != "user" or names[-1] != "done" \
+                    or any(name != "delta" for name in names[1:-1]):
+                print(f"❌ Failed - Unexpected event sequence: {names}")
+                return False
+
+            user_msg, ai_msg = events[0][1], events[-1][1]
+            reply = "".join(data["content"] for _, data in events[1:-1])
+            if ai_msg["content"] != reply:
+                print("❌ Failed - done content does not match the streamed deltas")
+                return False
+
+            # The turn must be persisted once the stream has finished
+            saved = await self.client.get(f"conversations/{self.conversation_id}")
+            saved_ids = {m["id"] for m in saved.json().get("messages", [])}
+            if not {user_msg["id"], ai_msg["id"]} <= saved_ids:
+                print("❌ Failed - Streamed messages were not saved")
+                return False
+
+            self.tests_passed += 1
+            print(f"✅ Passed - Events: {names}")
+            return True
+
+        except httpx.TimeoutException:
+            print(f"❌ Failed - Request timeout (30s)")
+            return False
+        except httpx.ConnectError:
+            print(f"❌ Failed - Connection error")
+            return False
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            return False
+
+    async def test_end_conversation(self):
         """Test ending a conversation"""
         if not self.conversation_id:
             print("❌ Skipped - No conversation ID available")
             return False
             
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "End Conversation",
             "POST",
             f"conversations/{self.conversation_id}/end",
@@ -155,9 +250,9 @@ class AIPortalAPITester:
             print("   Conversation ended successfully")
         return success
 
-    def test_query_conversations(self):
+    async def test_query_conversations(self):
         """Test querying conversations with intelligence"""
-        success, response = self.run_test(
+        success, response = await self.run_test(
             "Query Conversations",
             "POST",
             "conversations/query",
@@ -168,9 +263,9 @@ class AIPortalAPITester:
             print("   Query processed successfully")
         return success
 
-    def test_invalid_endpoints(self):
+    async def test_invalid_endpoints(self):
         """Test invalid endpoints return proper errors"""
-        success, _ = self.run_test(
+        success, _ = await self.run_test(
             "Invalid Conversation ID",
             "GET",
             "conversations/invalid-id",
@@ -178,30 +273,47 @@ class AIPortalAPITester:
         )
         return success
 
-def main():
+async def main():
     print("🚀 Starting AI Chat Portal API Tests")
     print("=" * 50)
     
     tester = AIPortalAPITester()
     
-    # Test sequence
-    tests = [
+    # Tests that don't depend on each other run concurrently
+    independent_tests = [
         ("API Root", tester.test_api_root),
         ("Get Empty Conversations", tester.test_get_conversations_empty),
+        ("Query Conversations", tester.test_query_conversations),
+        ("Invalid Endpoints", tester.test_invalid_endpoints),
+    ]
+    
+    # These share the created conversation and must run in order
+    sequential_tests = [
         ("Create Conversation", tester.test_create_conversation),
         ("Get Conversations With Data", tester.test_get_conversations_with_data),
         ("Get Specific Conversation", tester.test_get_specific_conversation),
         ("Send Message", tester.test_send_message),
+        ("React With $-Prefixed Reaction", tester.test_react_literal_reaction),
+        ("Send Message (Stream)", tester.test_send_message_stream),
         ("End Conversation", tester.test_end_conversation),
-        ("Query Conversations", tester.test_query_conversations),
-        ("Invalid Endpoints", tester.test_invalid_endpoints),
     ]
     
-    for test_name, test_func in tests:
-        try:
-            test_func()
-        except Exception as e:
-            print(f"❌ {test_name} - Unexpected error: {str(e)}")
+    try:
+        results = await asyncio.gather(
+            *(test_func() for _, test_func in independent_tests),
+            return_exceptions=True
+        )
+        for (test_name, _), result in zip(independent_tests, results):
+            if isinstance(result, Exception):
+                print(f"❌ {test_name} - Unexpected error: {str(result)}")
+        
+        for test_name, test_func in sequential_tests:
+            try:
+                await test_func()
+            except Exception as e:
+                print(f"❌ {test_name} - Unexpected error: {str(e)}")
+    finally:
+        await tester.close()
     
     # Print results
     print("\n" + "=" * 50)
@@ -215,4 +327,4 @@ def main():
         return 1
 
 if __name__ == "__main__":
-    sys.exit(main())
+    sys.exit(asyncio.run(main()))